@@ -1,7 +1,13 @@
 import json
 import logging
-from typing import Iterable, Optional
+import sys
+from typing import Any, Iterable, Optional
 import click
+import numpy as np
+import pandas as pd
+import orjson
+import pyarrow
+import pyarrow.csv
 import epss.epss
 from epss.epss import MIN_DATE, Client
 
@@ -10,6 +16,36 @@ JSON = "json"
 CSV = "csv"
 
 
+def write_json(obj: Any):
+    """
+    Write an object to stdout as a single line of JSON.
+    """
+    sys.stdout.buffer.write(orjson.dumps(obj))
+    sys.stdout.buffer.write(b"\n")
+
+
+def write_csv(df: pd.DataFrame, include_header: bool = True):
+    """
+    Write a dataframe to stdout as CSV.
+    """
+    if include_header:
+        sys.stdout.buffer.write(",".join(df.columns).encode() + b"\n")
+
+    # Format floats the way pandas does (e.g. 1.0 and 4e-05 rather than 1 and 0.00004) and leave NaNs empty.
+    columns = {}
+    for name, column in df.items():
+        if pd.api.types.is_float_dtype(column.dtype):
+            values = column.to_numpy()
+            columns[name] = pyarrow.array(values.astype(str), mask=np.isnan(values))
+        else:
+            columns[name] = pyarrow.array(column)
+
+    # EPSS scores never contain delimiters or quotes, so values don't need to be quoted.
+    table = pyarrow.table(columns)
+    options = pyarrow.csv.WriteOptions(include_header=False, quoting_style="none")
+    pyarrow.csv.write_csv(table, sys.stdout.buffer, write_options=options)
+
+
 @click.group()
 def cli():
     """
@@ -36,7 +72,7 @@ def list_cve_ids(date: Optional[str], output_format: str):
         for cve_id in cve_ids:
             print(cve_id)
     elif output_format == JSON:
-        print(json.dumps(cve_ids))
+        write_json(cve_ids)
     else:
         raise ValueError(f"Invalid output format: {output_format}")
 
@@ -114,11 +150,13 @@ def list_scores(
         min_percentile=min_percentile,
         max_percentile=max_percentile,
     )
+    include_header = True
     for _, df in scores:
         if output_format == JSON:
             print(df.to_json(orient="records"))
         elif output_format == CSV:
-            print(df.to_csv(index=False))
+            write_csv(df, include_header=include_header)
+            include_header = False
         else:
             raise ValueError(f"Invalid output format: {output_format}")
 
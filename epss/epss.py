@@ -1,15 +1,20 @@
+import collections
 import datetime
-import io
+import functools
 import logging
 import os
 import re
 import tempfile
+import threading
+import time
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from epss import cli
 import epss.pattern_matching
 from typing import Iterable, Iterator, Optional, Tuple, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import concurrent.futures
 
 logger = logging.getLogger(__name__)
@@ -19,11 +24,40 @@ DATE = Union[str, datetime.date, datetime.datetime]
 WORKDIR = os.path.join(tempfile.gettempdir(), "epss-scores")
 MIN_DATE = "2022-07-15"
 
+# Each file holds a single date, so it's stored once as a category rather than once per row.
+DTYPES = {"date": "category"}
+
+# Maximum number of files to read concurrently.
+MAX_WORKERS = os.cpu_count() or 1
+
+# Maximum number of files to download concurrently.
+MAX_DOWNLOADS = 16
+
+# Maximum number of pooled HTTP connections to epss.cyentia.com.
+MAX_CONNECTIONS = MAX_DOWNLOADS
+
+# How long to trust the latest available date before checking again (in seconds).
+MAX_DATE_TTL = 60
+
+_max_date_cache: Optional[Tuple[float, datetime.date]] = None
+_max_date_lock = threading.Lock()
+
 
 @dataclass()
 class Client:
     workdir: str = WORKDIR
     enable_progress_bar: bool = True
+    max_date_ttl: float = MAX_DATE_TTL
+    _max_date: Optional[Tuple[float, datetime.date]] = field(
+        default=None, init=False, repr=False
+    )
+    _session: Optional[requests.Session] = field(default=None, init=False, repr=False)
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = create_session()
+        return self._session
 
     @property
     def min_date(self) -> datetime.date:
@@ -31,7 +65,10 @@ class Client:
 
     @property
     def max_date(self) -> datetime.date:
-        return get_max_date()
+        now = time.monotonic()
+        if self._max_date is None or now - self._max_date[0] >= self.max_date_ttl:
+            self._max_date = (now, get_max_date(ttl=0, session=self.session))
+        return self._max_date[1]
 
     def get_min_date(self) -> datetime.date:
         return self.min_date
@@ -84,7 +121,7 @@ class Client:
             max_percentile=max_percentile,
         ):
             dfs.append(df)
-        return pd.concat(dfs)
+        return pd.concat(dfs, ignore_index=True)
 
     def iter_scores_grouped_by_date(
         self,
@@ -99,21 +136,38 @@ class Client:
         """
         Iterate over EPSS scores observed over a given date range.
         """
+        min_date, max_date = parse_date_range(min_date, max_date)
         self.download_scores_by_date_range(
             min_date=min_date,
             max_date=max_date,
         )
-        for date in iter_dates(min_date=min_date, max_date=max_date):
-            df = self.get_scores_by_date(
-                date=date,
-                cve_ids=cve_ids,
-                min_score=min_score,
-                max_score=max_score,
-                min_percentile=min_percentile,
-                max_percentile=max_percentile,
-            )
-            if not df.empty:
-                yield date, df
+        get_scores_by_date = functools.partial(
+            self.get_scores_by_date,
+            cve_ids=cve_ids,
+            min_score=min_score,
+            max_score=max_score,
+            min_percentile=min_percentile,
+            max_percentile=max_percentile,
+        )
+
+        # Read a bounded number of files ahead while preserving the order of dates.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pending = collections.deque()
+            for date in iter_dates(min_date=min_date, max_date=max_date):
+                pending.append((date, executor.submit(get_scores_by_date, date=date)))
+                if len(pending) < MAX_WORKERS:
+                    continue
+
+                date, future = pending.popleft()
+                df = future.result()
+                if not df.empty:
+                    yield date, df
+
+            while pending:
+                date, future = pending.popleft()
+                df = future.result()
+                if not df.empty:
+                    yield date, df
 
     def get_scores_by_date(
         self,
@@ -127,20 +181,19 @@ class Client:
         """
         Get EPSS scores for a given date.
         """
-        date = parse_date(date) if date else get_max_date()
+        date = parse_date(date) if date else self.get_max_date()
         path = self.get_path_to_scores_by_date(date)
         if not os.path.exists(path):
-            download_scores_by_date(path=path, date=date)
-
-        df = pd.read_csv(path)
-        if any(
-            (
-                cve_ids,
-                min_score,
-                max_score,
-                min_percentile,
-                max_percentile,
-            )
+            legacy_path = self.get_legacy_path_to_scores_by_date(date)
+            if os.path.exists(legacy_path):
+                migrate_scores_file(legacy_path=legacy_path, path=path)
+            else:
+                download_scores_by_date(path=path, date=date, session=self.session)
+
+        df = read_scores(path)
+        if cve_ids or any(
+            x is not None
+            for x in (min_score, max_score, min_percentile, max_percentile)
         ):
             df = filter_scores(
                 df=df,
@@ -164,8 +217,11 @@ class Client:
         downloads = []
         for date in iter_dates(min_date=min_date, max_date=max_date):
             path = self.get_path_to_scores_by_date(date)
+            legacy_path = self.get_legacy_path_to_scores_by_date(date)
             if os.path.exists(path):
                 logger.debug(f"Skipping {path} (already exists)")
+            elif os.path.exists(legacy_path):
+                migrate_scores_file(legacy_path=legacy_path, path=path)
             else:
                 downloads.append((path, date))
 
@@ -174,11 +230,14 @@ class Client:
             logger.info(
                 f"Downloading {total} {'files' if total > 1 else 'file'} containing EPSS scores from {min_date.isoformat()} to {max_date.isoformat()}"
             )
-            with concurrent.futures.ThreadPoolExecutor() as executor:
+            session = self.session
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_DOWNLOADS
+            ) as executor:
                 futures = []
                 for path, date in downloads:
                     future = executor.submit(
-                        download_scores_by_date, path=path, date=date
+                        download_scores_by_date, path=path, date=date, session=session
                     )
                     futures.append(future)
                 concurrent.futures.wait(futures)
@@ -188,15 +247,28 @@ class Client:
         date: DATE,
     ):
         path = self.get_path_to_scores_by_date(date)
-        if not (os.path.exists(path) and os.path.getsize(path) > 0):
+        legacy_path = self.get_legacy_path_to_scores_by_date(date)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            logger.debug(f"Skipping {path} (already exists)")
+        elif os.path.exists(legacy_path):
+            migrate_scores_file(legacy_path=legacy_path, path=path)
+        else:
             download_scores_by_date(
                 path=path,
                 date=date,
+                session=self.session,
             )
 
     def get_path_to_scores_by_date(self, date: DATE) -> str:
         """
-        Get the path to the CSV file containing EPSS scores for a given date.
+        Get the path to the Feather file containing EPSS scores for a given date.
+        """
+        date = parse_date(date)
+        return os.path.join(self.scores_by_date_dir, f"{date.isoformat()}.feather")
+
+    def get_legacy_path_to_scores_by_date(self, date: DATE) -> str:
+        """
+        Get the path to the CSV file that older releases used to cache EPSS scores for a given date.
         """
         date = parse_date(date)
         return os.path.join(self.scores_by_date_dir, f"{date.isoformat()}.csv.gz")
@@ -211,9 +283,10 @@ def download_scores_by_date(
     max_score: Optional[float] = None,
     min_percentile: Optional[float] = None,
     max_percentile: Optional[float] = None,
+    session: Optional[requests.Session] = None,
 ):
     """
-    Download EPSS scores for a given date and save them to a CSV file.
+    Download EPSS scores for a given date and save them to a Feather file.
     """
     url = get_download_url(date)
     df = get_scores_by_date(
@@ -223,12 +296,48 @@ def download_scores_by_date(
         max_score=max_score,
         min_percentile=min_percentile,
         max_percentile=max_percentile,
+        session=session,
     )
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+    write_scores(df=df, path=path)
     logger.info(f"Downloaded {url} to {path}")
 
 
+def migrate_scores_file(legacy_path: str, path: str):
+    """
+    Convert a CSV file containing EPSS scores to a Feather file and remove the CSV file.
+    """
+    df = pd.read_csv(legacy_path, dtype=DTYPES)
+    write_scores(df=df, path=path)
+    os.remove(legacy_path)
+    logger.info(f"Migrated {legacy_path} to {path}")
+
+
+def read_scores(path: str) -> pd.DataFrame:
+    """
+    Read a Feather file containing EPSS scores.
+
+    Recently parsed files are cached in memory and invalidated when the file on disk changes. Callers receive a copy, so
+    modifying the result doesn't affect the cache.
+    """
+    path = os.path.abspath(path)
+    df = _read_scores(path, os.path.getmtime(path))
+    return df.copy()
+
+
+# Only keep a few files around: repeated lookups tend to hit the same date, while scans over a date range never do.
+@functools.lru_cache(maxsize=4)
+def _read_scores(path: str, mtime: float) -> pd.DataFrame:
+    return pd.read_feather(path)
+
+
+def write_scores(df: pd.DataFrame, path: str):
+    """
+    Write a dataframe of EPSS scores to a zstd-compressed Feather file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.reset_index(drop=True).to_feather(path, compression="zstd")
+
+
 def get_scores_by_date(
     date: DATE,
     cve_ids: Optional[Iterable[str]] = None,
@@ -236,18 +345,28 @@ def get_scores_by_date(
     max_score: Optional[float] = None,
     min_percentile: Optional[float] = None,
     max_percentile: Optional[float] = None,
+    session: Optional[requests.Session] = None,
 ):
+    date = parse_date(date)
     url = get_download_url(date)
     logger.info(f"Downloading {url}")
-    response = requests.get(url, stream=True)
-    if response.status_code != 200:
-        logger.info(f"Failed to download {url} (status code: {response.status_code})")
-    response.raise_for_status()
+    with (session or requests).get(url, stream=True) as response:
+        if response.status_code != 200:
+            logger.info(
+                f"Failed to download {url} (status code: {response.status_code})"
+            )
+        response.raise_for_status()
 
-    df = pd.read_csv(io.BytesIO(response.content), skiprows=1, compression="gzip")
-    df["date"] = date.isoformat()
+        response.raw.decode_content = True
+        df = pd.read_csv(response.raw, skiprows=1, compression="gzip", dtype=DTYPES)
+
+    df["date"] = pd.Categorical.from_codes(
+        np.zeros(len(df), dtype=np.int8), categories=[date.isoformat()]
+    )
 
-    if any((cve_ids, min_score, max_score, min_percentile, max_percentile)):
+    if cve_ids or any(
+        x is not None for x in (min_score, max_score, min_percentile, max_percentile)
+    ):
         df = filter_scores(
             df=df,
             cve_ids=cve_ids,
@@ -270,27 +389,41 @@ def filter_scores(
     """
     Filter a dataframe of EPSS scores.
     """
-    df = df.copy()
-
+    # Combine every condition into one mask so that rows are only selected once.
+    mask = np.ones(len(df), dtype=bool)
     if cve_ids:
-        f = lambda cve_id: epss.pattern_matching.string_matches_any_pattern(
-            cve_id, cve_ids
-        )
-        df = df[df["cve"].apply(f)]
-
-    if min_score is not None:
-        df = df[df["epss"] >= min_score]
-
-    if max_score is not None:
-        df = df[df["epss"] <= max_score]
-
-    if min_percentile is not None:
-        df = df[df["percentile"] >= min_percentile]
-
-    if max_percentile is not None:
-        df = df[df["percentile"] <= max_percentile]
+        literals = set()
+        patterns = []
+        for cve_id in cve_ids:
+            if epss.pattern_matching.is_pattern(cve_id):
+                patterns.append(cve_id)
+            else:
+                literals.add(cve_id.lower())
+
+        cves = df["cve"]
+        matches = np.zeros(len(df), dtype=bool)
+        if literals:
+            matches |= cves.str.lower().isin(literals).to_numpy()
+        if patterns:
+            # Match on object dtype so that pyarrow-backed strings don't hand the regex to RE2, which rejects \Z.
+            regex = epss.pattern_matching.compile_patterns(patterns)
+            matched = cves.astype(object).str.match(regex.pattern, flags=regex.flags)
+            matches |= matched.to_numpy(dtype=bool, na_value=False)
+        mask &= matches
+
+    # Reuse a single buffer for each comparison instead of allocating one per bound.
+    buffer = np.empty(len(df), dtype=bool)
+    for column, op, bound in (
+        ("epss", np.greater_equal, min_score),
+        ("epss", np.less_equal, max_score),
+        ("percentile", np.greater_equal, min_percentile),
+        ("percentile", np.less_equal, max_percentile),
+    ):
+        if bound is not None:
+            op(df[column].to_numpy(), bound, out=buffer)
+            mask &= buffer
 
-    return df
+    return df[mask]
 
 
 def parse_date(date: DATE) -> datetime.date:
@@ -300,14 +433,18 @@ def parse_date(date: DATE) -> datetime.date:
     If a date is provided as a string, it must be in ISO format (YYYY-MM-DD).
     """
     if isinstance(date, str):
-        date = datetime.date.fromisoformat(date)
+        return _parse_iso_date(date)
     elif isinstance(date, datetime.datetime):
-        date = date.date()
+        return date.date()
     elif isinstance(date, datetime.date):
-        pass
+        return date
     else:
         raise TypeError(f"Invalid date: {date}")
-    return date
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_iso_date(date: str) -> datetime.date:
+    return datetime.date.fromisoformat(date)
 
 
 def iter_dates(
@@ -319,8 +456,10 @@ def iter_dates(
     min_date = min_date or MIN_DATE
     max_date = max_date or get_max_date()
     min_date, max_date = parse_date_range(min_date, max_date)
-    for date in pd.date_range(min_date, max_date, freq="D"):
-        yield date.date()
+    date = min_date
+    while date <= max_date:
+        yield date
+        date += datetime.timedelta(days=1)
 
 
 def parse_date_range(
@@ -336,30 +475,49 @@ def parse_date_range(
     return min_date, max_date
 
 
-def get_min_date(check: bool = False) -> datetime.datetime:
+def get_min_date(
+    check: bool = False, session: Optional[requests.Session] = None
+) -> datetime.datetime:
     """
     Returns the earliest date for which EPSS scores are available (i.e. 2022-07-15).
     """
     if check is False:
         return datetime.date.fromisoformat(MIN_DATE)
 
-    # TODO: improve upon brute force search
-    max_date = get_max_date()
-    date = max_date
-    while True:
-        url = get_download_url(date)
-        response = requests.head(url)
-        if response.status_code != 200:
-            return date
-        date -= datetime.timedelta(days=1)
-
-
-def get_max_date() -> datetime.date:
+    # Binary search between a date that predates EPSS and the latest available date.
+    lo = datetime.date(2020, 1, 1)
+    hi = get_max_date(session=session)
+    while lo < hi:
+        mid = lo + (hi - lo) // 2
+        url = get_download_url(mid)
+        response = (session or requests).head(url)
+        if response.status_code == 200:
+            hi = mid
+        else:
+            lo = mid + datetime.timedelta(days=1)
+    return lo
+
+
+def get_max_date(
+    ttl: float = MAX_DATE_TTL, session: Optional[requests.Session] = None
+) -> datetime.date:
     """
     Determine the latest date for which EPSS scores are available.
+
+    The result is cached for `ttl` seconds to avoid repeating the same HTTP request.
     """
+    global _max_date_cache
+
+    with _max_date_lock:
+        now = time.monotonic()
+        if _max_date_cache is None or now - _max_date_cache[0] >= ttl:
+            _max_date_cache = (now, _get_max_date(session=session))
+        return _max_date_cache[1]
+
+
+def _get_max_date(session: Optional[requests.Session] = None) -> datetime.date:
     url = "https://epss.cyentia.com/epss_scores-current.csv.gz"
-    response = requests.head(url)
+    response = (session or requests).head(url)
     response.raise_for_status()
     location = response.headers["location"]
 
@@ -369,6 +527,18 @@ def get_max_date() -> datetime.date:
     return datetime.date.fromisoformat(match.group(1))
 
 
+def create_session() -> requests.Session:
+    """
+    Create an HTTP session that reuses connections across requests and threads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_CONNECTIONS, pool_maxsize=MAX_CONNECTIONS, max_retries=3
+    )
+    session.mount("https://", adapter)
+    return session
+
+
 def get_download_url(date: Optional[DATE] = None) -> str:
     date = parse_date(date) if date else get_max_date()
     return f"https://epss.cyentia.com/epss_scores-{date.isoformat()}.csv.gz"
@@ -1,10 +1,13 @@
+import collections
+import concurrent.futures
 import json
 import math
 import os
+import threading
+import time
 from typing import Iterator, Optional
 import logging
 import requests
-from threading import Event
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +15,10 @@ API_KEY = os.environ.get('NIST_NVD_API_KEY')
 
 PRODUCTS_URL = 'https://services.nvd.nist.gov/rest/json/cpes/2.0'
 
+# With an API key, the NVD allows 50 requests in a rolling 30 second window.
+API_KEY_RATE_LIMIT = (50, 30)
+MAX_WORKERS = 5
+
 
 def iter_products() -> Iterator[dict]:
   yield from query(PRODUCTS_URL, subkey='products')
@@ -22,38 +29,99 @@ def query(url: str, subkey: str, api_key: Optional[str] = API_KEY):
   if not api_key:
     logger.warning('NIST_NVD_API_KEY not set, queries will be rate limited to 1 every 6 seconds')
 
-  page_number = 0
-  total_results = None
-  total_pages = None
+  headers = {'apiKey': api_key} if api_key else {}
+  rate_limiter = RateLimiter(*API_KEY_RATE_LIMIT) if api_key else None
+  reply = get_page(url, start_index=0, headers=headers, rate_limiter=rate_limiter)
+  yield from reply[subkey]
+
+  # Determing how many pages of results there are.
+  total_results = reply['totalResults']
+  page_size = reply['resultsPerPage']
+  total_pages = math.ceil(total_results / page_size) if page_size else 1
+  if total_pages <= 1:
+    logger.debug(f'Response contains {total_results} results, no pagination required')
+    return
 
-  event = Event()
-  while not event.is_set():
-    response = requests.get(url, params={'startIndex': page_number})
+  logger.info(f'Found {total_results} spanning {total_pages} pages with a page size of {page_size}')
+  logger.info(f'Read page 1/{total_pages}')
+  pages = range(1, total_pages)
+
+  # Without an API key, stick to one request every 6 seconds.
+  if not api_key:
+    event = threading.Event()
+    for page_number in pages:
+      event.wait(timeout=6)
+      reply = get_page(url, start_index=page_number * page_size, headers=headers)
+      yield from reply[subkey]
+      logger.info(f'Read page {page_number + 1}/{total_pages}')
+    return
+
+  # With an API key, fetch a bounded number of pages ahead within the rate limit while preserving page order.
+  with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    pending = collections.deque()
+    for page_number in pages:
+      future = executor.submit(
+        get_page,
+        url,
+        start_index=page_number * page_size,
+        headers=headers,
+        rate_limiter=rate_limiter,
+      )
+      pending.append((page_number, future))
+      if len(pending) < MAX_WORKERS:
+        continue
+
+      page_number, future = pending.popleft()
+      yield from future.result()[subkey]
+      logger.info(f'Read page {page_number + 1}/{total_pages}')
+
+    while pending:
+      page_number, future = pending.popleft()
+      yield from future.result()[subkey]
+      logger.info(f'Read page {page_number + 1}/{total_pages}')
+
+
+def get_page(url: str, start_index: int, headers: dict, rate_limiter: Optional['RateLimiter'] = None) -> dict:
+  """
+  Read a single page of results starting at the provided offset.
+  """
+  event = threading.Event()
+  while True:
+    if rate_limiter is not None:
+      rate_limiter.acquire()
+
+    response = requests.get(url, params={'startIndex': start_index}, headers=headers)
     if response.status_code == 403:
       logger.warning(f'Rate limit exceeded - sleeping for 6 seconds')
       event.wait(timeout=6)
       continue
-      
-    reply = response.json()
-    yield from reply[subkey]
-
-    # Determing how many pages of results there are.
-    if total_pages is None:      
-      total_results = reply['totalResults']
-      page_size = reply['resultsPerPage']
-      total_pages = math.ceil(total_results / page_size)
-      if total_pages != 1:
-        logger.info(f'Found {total_results} spanning {total_pages} pages with a page size of {page_size}')
-      else:
-        logger.debug(f'Response contains {total_results} results, no pagination required')
-        break
-    
-    page_number += 1
-    logger.info(f'Read page {page_number}/{total_pages}')
-    if page_number >= total_pages:
-      break
 
-    event.wait(timeout=6)
+    response.raise_for_status()
+    return response.json()
+
+
+class RateLimiter:
+  """
+  Token bucket allowing up to `limit` requests every `period` seconds.
+  """
+  def __init__(self, limit: int, period: float):
+    self.limit = limit
+    self.period = period
+    self.tokens = float(limit)
+    self.updated_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.limit / self.period)
+        self.updated_at = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        delay = (1 - self.tokens) * self.period / self.limit
+      time.sleep(delay)
 
 
 if __name__ == "__main__":
@@ -1,24 +1,45 @@
 import fnmatch
-from typing import Iterable
+import functools
+import re
+from typing import FrozenSet, Iterable
 
 CASE_SENSITIVE = False
 
+PATTERN_CHARS = frozenset("*?[")
+
+
+def is_pattern(string: str) -> bool:
+  """
+  Determine whether the provided string contains any wildcard characters.
+  """
+  return any(c in PATTERN_CHARS for c in string)
+
+
+def compile_patterns(patterns: Iterable[str], case_sensitive: bool = CASE_SENSITIVE) -> re.Pattern:
+  """
+  Compile the provided patterns into a single regular expression that matches any of them.
+  """
+  return _compile_patterns(frozenset(patterns), case_sensitive)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_patterns(patterns: FrozenSet[str], case_sensitive: bool) -> re.Pattern:
+  if not patterns:
+    return re.compile(r"(?!)")
+
+  regex = "|".join(f"(?:{fnmatch.translate(p)})" for p in sorted(patterns))
+  return re.compile(regex, 0 if case_sensitive else re.IGNORECASE)
+
 
 def string_matches_pattern(string: str, pattern: str, case_sensitive: bool = CASE_SENSITIVE) -> bool:
   """
   Determine whether the provided string matches the provided pattern.
   """
-  if not case_sensitive:
-    string = string.lower()
-    pattern = pattern.lower()
-  return fnmatch.fnmatch(string, pattern)
+  return string_matches_any_pattern(string, [pattern], case_sensitive=case_sensitive)
 
 
 def string_matches_any_pattern(string: str, patterns: Iterable[str], case_sensitive: bool = CASE_SENSITIVE) -> bool:
   """
   Determine whether the provided string matches the provided pattern.
   """
-  if not case_sensitive:
-    string = string.lower()
-    patterns = [p.lower() for p in patterns]
-  return any(fnmatch.fnmatch(string, pattern) for pattern in patterns)
+  return compile_patterns(patterns, case_sensitive=case_sensitive).match(string) is not None